@@ -1,8 +1,12 @@
 import csv
 import time
 import random
-import requests
-from bs4 import BeautifulSoup
+import queue
+import asyncio
+import threading
+import httpx
+import lxml.html
+from lxml import etree
 from urllib.parse import urljoin, urlparse
 import logging
 import re
@@ -15,6 +19,8 @@ OUTPUT_CSV = "registration_results.csv"
 EMAILS_FILE = "emails.txt"
 REGISTRATION_TIMEOUT = 10
 DELAY_BETWEEN_REGISTRATIONS = (2, 5)
+CSV_BATCH_SIZE = 512
+MAX_CONCURRENT_SITES = 50
 
 # Load email addresses from file
 def load_emails():
@@ -22,8 +28,6 @@ def load_emails():
         with open(EMAILS_FILE, 'r', encoding='utf-8') as f:
             emails = [line.strip() for line in f if line.strip()]
 
-        random.shuffle(emails)
-        random.shuffle(emails)
         random.shuffle(emails)
         return emails
     except FileNotFoundError:
@@ -36,6 +40,7 @@ EMAIL_ADDRESSES = load_emails()
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
+logging.getLogger('httpx').setLevel(logging.WARNING)
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
@@ -43,76 +48,101 @@ HEADERS = {
     "Accept-Language": "en-US,en;q=0.5",
 }
 
-def find_newsletter_form(soup, url):
-    forms = soup.find_all('form')
+NEWSLETTER_FORM_KEYWORDS = frozenset({'newsletter', 'subscribe', 'signup', 'join', 'mailing'})
+SUCCESS_KEYWORDS = frozenset({'thank', 'success', 'confirm', 'subscribed', 'check your email', 'welcome'})
+ERROR_KEYWORDS = frozenset({'error', 'invalid', 'failed', 'already subscribed'})
+SKIPPED_INPUT_TYPES = frozenset({'submit', 'button'})
+TRUTHY_VALUES = frozenset({'true', '1', 'yes'})
+
+def _keywords_re(keywords):
+    return re.compile(b'|'.join(re.escape(kw.encode()) for kw in sorted(keywords)))
+
+_NEWSLETTER_FORM_RE = _keywords_re(NEWSLETTER_FORM_KEYWORDS)
+_SUCCESS_RE = _keywords_re(SUCCESS_KEYWORDS)
+_ERROR_RE = _keywords_re(ERROR_KEYWORDS)
+
+_FORM_XP = etree.XPath("//form")
+_EMAIL_IN_XP = etree.XPath(".//input[@type='email']")
+_TEXT_IN_XP = etree.XPath(".//input[@type='text']")
+_FIELD_XP = etree.XPath(".//input|.//textarea")
+
+def find_newsletter_form(root, url):
+    forms = _FORM_XP(root)
     for form in forms:
-        form_str = str(form).lower()
-        email_inputs = form.find_all('input', {'type': 'email'})
+        form_bytes = etree.tostring(form, with_tail=False).lower()
+        email_inputs = _EMAIL_IN_XP(form)
         if not email_inputs:
-            text_inputs = form.find_all('input', {'type': 'text'})
+            text_inputs = _TEXT_IN_XP(form)
             for inp in text_inputs:
                 name = (inp.get('name', '') + inp.get('id', '') + inp.get('placeholder', '')).lower()
                 if 'email' in name or 'mail' in name:
                     email_inputs.append(inp)
         if email_inputs:
-            newsletter_keywords = ['newsletter', 'subscribe', 'signup', 'join', 'mailing']
-            if any(kw in form_str for kw in newsletter_keywords):
+            if _NEWSLETTER_FORM_RE.search(form_bytes):
                 email_input = email_inputs[0]
                 action = form.get('action', '')
                 method = form.get('method', 'post').lower()
                 fields = {}
-                for inp in form.find_all(['input', 'textarea']):
+                for inp in _FIELD_XP(form):
                     name = inp.get('name')
                     if name:
                         value = inp.get('value', '')
                         input_type = inp.get('type', '').lower()
-                        if input_type in ['submit', 'button']:
+                        if input_type in SKIPPED_INPUT_TYPES:
                             continue
                         fields[name] = value
                 email_field_name = email_input.get('name', 'email')
+                if not action:
+                    action = url
+                elif not action.startswith(('http://', 'https://')):
+                    action = urljoin(url, action)
                 return {
-                    'action': urljoin(url, action) if action else url,
+                    'action': action,
                     'method': method,
                     'fields': fields,
                     'email_field': email_field_name
                 }
     return None
 
-def register_to_newsletter(url, email, paths):
-    session = requests.Session()
-    session.headers.update(HEADERS)
+def make_client():
+    return httpx.AsyncClient(headers=HEADERS, timeout=REGISTRATION_TIMEOUT, verify=False, follow_redirects=True)
+
+async def register_to_newsletter(client, url, email, paths):
+    # Keep pooled connections but start every registration without cookies
+    client.cookies.clear()
     paths_to_try = []
     if paths:
         paths_to_try = paths.split(';')
     if not paths_to_try or '/' not in paths_to_try:
         paths_to_try.insert(0, '/')
+    parsed = urlparse(url)
+    base_url = f"{parsed.scheme}://{parsed.netloc}"
     for path in paths_to_try:
+        full_url = base_url + path
         try:
-            parsed = urlparse(url)
-            base_url = f"{parsed.scheme}://{parsed.netloc}"
-            full_url = base_url + path
-            logger.info(f"Trying {full_url}")
-            response = session.get(full_url, timeout=REGISTRATION_TIMEOUT, verify=False)
+            logger.debug("Trying %s", full_url)
+            response = await client.get(full_url)
             if response.status_code >= 400:
                 logger.warning(f"Got status {response.status_code}")
                 continue
-            soup = BeautifulSoup(response.text, 'lxml')
-            form_data = find_newsletter_form(soup, full_url)
+            try:
+                root = lxml.html.fromstring(response.content)
+            except etree.ParserError:
+                root = None
+            form_data = find_newsletter_form(root, full_url) if root is not None else None
             if not form_data:
                 logger.warning(f"No newsletter form found on {full_url}")
                 continue
             form_data['fields'][form_data['email_field']] = email
-            logger.info(f"Found form, submitting to {form_data['action']}")
-            logger.info(f"Email field: {form_data['email_field']}")
+            logger.debug("Found form, submitting to %s", form_data['action'])
+            logger.debug("Email field: %s", form_data['email_field'])
             if form_data['method'] == 'get':
-                submit_response = session.get(form_data['action'], params=form_data['fields'], timeout=REGISTRATION_TIMEOUT, verify=False, allow_redirects=True)
+                submit_response = await client.get(form_data['action'], params=form_data['fields'])
             else:
-                submit_response = session.post(form_data['action'], data=form_data['fields'], timeout=REGISTRATION_TIMEOUT, verify=False, allow_redirects=True)
-            response_text = submit_response.text.lower()
-            success_keywords = ['thank', 'success', 'confirm', 'subscribed', 'check your email', 'welcome']
-            error_keywords = ['error', 'invalid', 'failed', 'already subscribed']
-            has_success = any(kw in response_text for kw in success_keywords)
-            has_error = any(kw in response_text for kw in error_keywords)
+                submit_response = await client.post(form_data['action'], data=form_data['fields'])
+            response_bytes = submit_response.content.lower()
+            has_success = _SUCCESS_RE.search(response_bytes) is not None
+            has_error = _ERROR_RE.search(response_bytes) is not None
             if has_success and not has_error:
                 logger.info(f"✅ Successfully registered to {full_url}")
                 return True, "Success - confirmation detected"
@@ -122,7 +152,7 @@ def register_to_newsletter(url, email, paths):
             else:
                 logger.info(f"✅ Form submitted to {full_url}")
                 return True, "Success - form submitted"
-        except requests.Timeout:
+        except httpx.TimeoutException:
             logger.warning(f"Timeout on {full_url}")
             continue
         except Exception as e:
@@ -136,7 +166,7 @@ def read_newsletter_sites():
         with open(INPUT_CSV, 'r', encoding='utf-8') as f:
             reader = csv.DictReader(f)
             for row in reader:
-                if row.get('has_newsletter', '').lower() in ['true', '1', 'yes']:
+                if row.get('has_newsletter', '').lower() in TRUTHY_VALUES:
                     confidence = int(row.get('confidence_score', 0))
                     if confidence >= 30:
                         sites.append({
@@ -147,8 +177,6 @@ def read_newsletter_sites():
                         })
         # Shuffle the sites list for randomness
         random.shuffle(sites)
-        random.shuffle(sites)
-        random.shuffle(sites)
         logger.info(f"Found {len(sites)} sites with newsletters (shuffled)")
         return sites
     except FileNotFoundError:
@@ -158,94 +186,112 @@ def read_newsletter_sites():
         logger.error(f"Error reading CSV: {e}")
         return []
 
+_results = queue.SimpleQueue()
+
+def _writer_loop(q):
+    with open(OUTPUT_CSV, 'a', buffering=1 << 20, newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        if f.tell() == 0:
+            writer.writerow(['timestamp', 'domain', 'url', 'email', 'success', 'message'])
+        done = False
+        while not done:
+            rows = [q.get()]
+            while len(rows) < CSV_BATCH_SIZE and not q.empty():
+                rows.append(q.get_nowait())
+            if rows[-1] is None:
+                rows.pop()
+                done = True
+            try:
+                writer.writerows(rows)
+                f.flush()
+            except Exception as e:
+                logger.error(f"Error saving result: {e}")
+
 def save_result(domain, url, email, success, message):
-    try:
-        with open(OUTPUT_CSV, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            if f.tell() == 0:
-                writer.writerow(['timestamp', 'domain', 'url', 'email', 'success', 'message'])
-            writer.writerow([time.strftime('%Y-%m-%d %H:%M:%S'), domain, url, email, success, message])
-    except Exception as e:
-        logger.error(f"Error saving result: {e}")
+    _results.put([time.strftime('%Y-%m-%d %H:%M:%S'), domain, url, email, success, message])
+
+async def process_site(site, i, total, semaphore, counts):
+    async with semaphore, make_client() as client:
+        logger.info(f"[SITE {i}/{total}] {site['domain']} (confidence: {site['confidence']})")
+
+        # Try with first email
+        first_email = EMAIL_ADDRESSES[0]
+        logger.info(f"  [{site['domain']}] [1/{len(EMAIL_ADDRESSES)}] Testing with: {first_email}")
+
+        success, message = await register_to_newsletter(client, site['url'], first_email, site['paths'])
+        save_result(site['domain'], site['url'], first_email, success, message)
+
+        if success:
+            counts['success'] += 1
+            counts['sites_with_success'] += 1
+            logger.info(f"  [{site['domain']}] ✅ {message}")
+            await asyncio.sleep(3)  # Wait 3 seconds after successful registration
+            logger.info(f"  [{site['domain']}] → Registering remaining {len(EMAIL_ADDRESSES) - 1} emails...")
+
+            # Register remaining emails
+            for j, email in enumerate(EMAIL_ADDRESSES[1:], 2):
+                logger.info(f"  [{site['domain']}] [{j}/{len(EMAIL_ADDRESSES)}] Using email: {email}")
+
+                success2, message2 = await register_to_newsletter(client, site['url'], email, site['paths'])
+                save_result(site['domain'], site['url'], email, success2, message2)
+
+                if success2:
+                    counts['success'] += 1
+                    logger.info(f"  [{site['domain']}] ✅ {message2}")
+                    await asyncio.sleep(3)  # Wait 3 seconds after successful registration
+                else:
+                    counts['fail'] += 1
+                    logger.info(f"  [{site['domain']}] ❌ {message2}")
+
+                # Small delay between emails for same site
+                await asyncio.sleep(1)
+        else:
+            counts['fail'] += 1
+            counts['skipped'] += len(EMAIL_ADDRESSES) - 1
+            logger.info(f"  [{site['domain']}] ❌ {message}")
+            logger.info(f"  [{site['domain']}] → Skipping remaining {len(EMAIL_ADDRESSES) - 1} emails (form doesn't work)")
+
+async def register_all(sites):
+    counts = {'success': 0, 'fail': 0, 'skipped': 0, 'sites_with_success': 0}
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_SITES)
+    await asyncio.gather(*[
+        process_site(site, i, len(sites), semaphore, counts)
+        for i, site in enumerate(sites, 1)
+    ])
+    return counts
 
 def run():
     logger.info("🚀 Newsletter Registration Bot Starting...")
-    import urllib3
-    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
     sites = read_newsletter_sites()
     if not sites:
         logger.error("No sites to process. Run app.py first to scan for newsletters.")
         return
     logger.info(f"📧 Using {len(EMAIL_ADDRESSES)} email addresses")
-    logger.info(f"🎯 Processing {len(sites)} sites")
+    logger.info(f"🎯 Processing {len(sites)} sites, {MAX_CONCURRENT_SITES} at a time")
     logger.info(f"📝 Strategy: Try first email, if successful then register all others\n")
     
-    success_count = 0
-    fail_count = 0
-    skipped_count = 0
-    sites_with_success = 0
-    
+    writer_thread = threading.Thread(target=_writer_loop, args=(_results,), daemon=True)
+    writer_thread.start()
     try:
-        for i, site in enumerate(sites, 1):
-            logger.info(f"\n{'='*60}")
-            logger.info(f"[SITE {i}/{len(sites)}] {site['domain']} (confidence: {site['confidence']})")
-            logger.info(f"{'='*60}")
-            
-            # Try with first email
-            first_email = EMAIL_ADDRESSES[0]
-            logger.info(f"\n  [1/{len(EMAIL_ADDRESSES)}] Testing with: {first_email}")
-            
-            success, message = register_to_newsletter(site['url'], first_email, site['paths'])
-            save_result(site['domain'], site['url'], first_email, success, message)
-            
-            if success:
-                success_count += 1
-                sites_with_success += 1
-                logger.info(f"  ✅ {message}")
-                time.sleep(3)  # Wait 3 seconds after successful registration
-                logger.info(f"  → Registering remaining {len(EMAIL_ADDRESSES) - 1} emails...")
-                
-                # Register remaining emails
-                for j, email in enumerate(EMAIL_ADDRESSES[1:], 2):
-                    logger.info(f"\n  [{j}/{len(EMAIL_ADDRESSES)}] Using email: {email}")
-                    
-                    success2, message2 = register_to_newsletter(site['url'], email, site['paths'])
-                    save_result(site['domain'], site['url'], email, success2, message2)
-                    
-                    if success2:
-                        success_count += 1
-                        logger.info(f"  ✅ {message2}")
-                        time.sleep(3)  # Wait 3 seconds after successful registration
-                    else:
-                        fail_count += 1
-                        logger.info(f"  ❌ {message2}")
-                    
-                    # Small delay between emails for same site
-                    time.sleep(1)
-            else:
-                fail_count += 1
-                skipped_count += len(EMAIL_ADDRESSES) - 1
-                logger.info(f"  ❌ {message}")
-                logger.info(f"  → Skipping remaining {len(EMAIL_ADDRESSES) - 1} emails (form doesn't work)")
-            
-            # Delay between different sites
-            if i < len(sites):
-                logger.info(f"\nWaiting 3 seconds before next site...")
-                time.sleep(3)
+        counts = asyncio.run(register_all(sites))
         
-        total_attempts = success_count + fail_count
+        sites_with_success = counts['sites_with_success']
+        total_attempts = counts['success'] + counts['fail']
         logger.info("\n" + "="*60)
         logger.info("📊 REGISTRATION SUMMARY")
         logger.info(f"Total sites processed: {len(sites)}")
         logger.info(f"Sites with working forms: {sites_with_success} ({sites_with_success/len(sites)*100:.1f}%)")
         logger.info(f"Total registration attempts: {total_attempts}")
-        logger.info(f"✅ Successful registrations: {success_count}")
-        logger.info(f"❌ Failed registrations: {fail_count}")
-        logger.info(f"⏭️  Skipped (no working form): {skipped_count}")
+        logger.info(f"✅ Successful registrations: {counts['success']}")
+        logger.info(f"❌ Failed registrations: {counts['fail']}")
+        logger.info(f"⏭️  Skipped (no working form): {counts['skipped']}")
         logger.info(f"📝 Results saved to: {OUTPUT_CSV}")
         logger.info("="*60)
     except Exception as e:
         logger.error(f"Fatal error: {e}")
+    finally:
+        _results.put(None)
+        writer_thread.join()
 
 if __name__ == "__main__":
     run()
@@ -0,0 +1,27 @@
+import time
+
+from app import detect_newsletter
+
+
+def test_iframe_inside_form_keeps_form_inputs():
+    html = (b'<form action="/x"><input type="email" name="e">'
+            b'<iframe src="https://www.google.com/recaptcha/api2/anchor"></iframe>'
+            b'<button>Subscribe</button></form>')
+    assert detect_newsletter(html, "https://example.com/") == (
+        True, 45, "form:email_input_type;form:newsletter_button"
+    )
+
+
+def test_newsletter_patterns_match_words_in_order_on_one_line():
+    _, _, signals = detect_newsletter(b"<p>Get our Weekly Digest</p>\n<p>digest weekly</p>", "")
+    assert signals == "pattern:get.*weekly.*digest"
+    _, _, signals = detect_newsletter(b"<p>digest</p>\n<p>get weekly</p>", "")
+    assert signals == ""
+
+
+def test_long_single_line_script_is_scanned_in_linear_time():
+    script = b'document.getElementById("a").value = "email";' * 5000
+    html = b"<html><body><script>" + script + b"</script>\nweekly subscription</body></html>"
+    start = time.perf_counter()
+    assert detect_newsletter(html, "") == (False, 0, "")
+    assert time.perf_counter() - start < 0.1